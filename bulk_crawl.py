@@ -6,80 +6,147 @@ Safely submits URLs from a file to the crawler API with:
 - Domain filtering (skips auth pages, search engines, localhost)
 - Domain-aware scheduling (spreads requests across domains)
 - Progress tracking (resume after interruption)
-- Rate limiting (configurable delays between submissions)
+- Rate limiting (batch_size submissions per delay_between_batches_ms)
+- Concurrent submission (asyncio + aiohttp worker pool, backs off on 429/5xx)
+
+Requires: pip install aiohttp aiolimiter
+Optional: pip install pyahocorasick orjson (faster pattern matching and JSON)
 
 Usage:
     python3 bulk_crawl.py pages_to_crawl.txt
     python3 bulk_crawl.py --dry-run pages_to_crawl.txt
     python3 bulk_crawl.py --limit 10 pages_to_crawl.txt
+    python3 bulk_crawl.py --jobs 32 pages_to_crawl.txt
 """
 
 import argparse
+import asyncio
 import json
 import os
+import re
 import sys
 import time
-from collections import defaultdict
-from itertools import zip_longest
+from collections import defaultdict, deque
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, TextIO
 from urllib.parse import urlparse
-import requests
+import aiohttp
+from aiolimiter import AsyncLimiter
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+SUBMIT_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+
+def loads_json(data: bytes):
+    """Parse JSON bytes, with orjson when available."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def dumps_json(obj) -> bytes:
+    """Serialize to JSON bytes, with orjson when available."""
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode()
+
 
 def load_config(config_path: str = None) -> dict:
     """Load checked-in defaults, then optional overrides."""
     default_config_path = Path(__file__).parent / "bulk_crawl_config.json"
-    with open(default_config_path) as f:
-        config = json.load(f)
+    with open(default_config_path, 'rb') as f:
+        config = loads_json(f.read())
     if config_path:
-        with open(config_path) as f:
-            config.update(json.load(f))
+        with open(config_path, 'rb') as f:
+            config.update(loads_json(f.read()))
+    config["_skip_set"] = frozenset(config["skip_domains"])
+    config["_browser_set"] = frozenset(config["browser_domains"])
+    config["_skip_pattern_match"] = compile_any(config["skip_patterns"])
     return config
 
 
+def compile_any(tokens: list[str]) -> Callable[[str], str | None]:
+    """Build a matcher returning a token found in the text, or None.
+
+    Uses a single Aho-Corasick automaton when pyahocorasick is installed,
+    otherwise a compiled regex alternation of the tokens.
+    """
+    if not tokens:
+        return lambda text: None
+    
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for token in tokens:
+            automaton.add_word(token, token)
+        automaton.make_automaton()
+        return lambda text: next((token for _, token in automaton.iter(text)), None)
+    
+    pattern = re.compile("|".join(re.escape(token) for token in tokens))
+    return lambda text: m.group(0) if (m := pattern.search(text)) else None
+
+
 def parse_domain(url: str) -> str:
-    """Extract domain from URL."""
+    """Extract the normalized host from URL (no userinfo, port or trailing dot)."""
     try:
-        parsed = urlparse(url)
-        return parsed.netloc.lower()
+        return (urlparse(url).hostname or "").rstrip(".")
     except Exception:
         return ""
 
 
-def should_skip_url(url: str, config: dict) -> tuple[bool, str]:
-    """Check if URL should be skipped. Returns (should_skip, reason)."""
+def domain_suffixes(domain: str):
+    """Yield a host and each of its parent domains (a.b.c, b.c, c)."""
+    parts = domain.split(".")
+    for i in range(len(parts)):
+        yield ".".join(parts[i:])
+
+
+def should_skip_url(url: str, config: dict) -> tuple[bool, str, str]:
+    """Check if URL should be skipped. Returns (should_skip, reason, domain).
+
+    domain is the parsed host, so callers don't parse the URL again; it is
+    empty when the URL is rejected before parsing.
+    """
+    # Skip non-http(s) URLs before paying for a parse
+    if not url.startswith(("http://", "https://")):
+        return True, "not HTTP/HTTPS", ""
+    
     domain = parse_domain(url)
     
     if not domain:
-        return True, "invalid URL"
+        return True, "invalid URL", ""
     
     # Check domain skip list
-    for skip_domain in config["skip_domains"]:
-        if skip_domain in domain or domain in skip_domain:
-            return True, f"domain '{skip_domain}' in skip list"
+    skip_set = config["_skip_set"]
+    for candidate in domain_suffixes(domain):
+        if candidate in skip_set:
+            return True, f"domain '{candidate}' in skip list", domain
     
     # Check URL patterns
-    url_lower = url.lower()
-    for pattern in config["skip_patterns"]:
-        if pattern in url_lower:
-            return True, f"matches skip pattern '{pattern}'"
-    
-    # Skip non-http(s) URLs
-    if not url.startswith(("http://", "https://")):
-        return True, "not HTTP/HTTPS"
+    if pattern := config["_skip_pattern_match"](url.lower()):
+        return True, f"matches skip pattern '{pattern}'", domain
     
-    return False, ""
+    return False, "", domain
 
 
-def needs_browser(url: str, config: dict) -> bool:
-    """Check if URL needs browser rendering."""
-    domain = parse_domain(url)
-    return any(bd in domain for bd in config["browser_domains"])
+def needs_browser(domain: str, config: dict) -> bool:
+    """Check if pages on a domain need browser rendering."""
+    browser_set = config["_browser_set"]
+    return any(candidate in browser_set for candidate in domain_suffixes(domain))
 
 
-def load_urls(filepath: str) -> list[str]:
-    """Load URLs from file, one per line."""
+def load_urls(filepath: str) -> Iterator[str]:
+    """Stream URLs from file, one per line, skipping blanks and comments."""
     with open(filepath) as f:
-        return [url for line in f if (url := line.strip()) and not url.startswith('#')]
+        for line in f:
+            url = line.strip()
+            if url and not url.startswith('#'):
+                yield url
 
 
 def load_progress(progress_file: str) -> set[str]:
@@ -87,102 +154,212 @@ def load_progress(progress_file: str) -> set[str]:
     if not os.path.exists(progress_file):
         return set()
     
-    with open(progress_file, 'r') as f:
-        return set(line.strip() for line in f if line.strip())
+    # splitlines() also handles the \r\n that text mode writes on Windows.
+    with open(progress_file, 'rb') as f:
+        return set(f.read().decode().splitlines()) - {''}
+
+
+class AdaptiveLimit:
+    """Async cap on in-flight submissions that adapts to crawler pushback (AIMD).
+
+    The limit halves on a 429/5xx response and grows by one after
+    `grow_after` consecutive successes, never exceeding `max_limit`. Each
+    entry gets a sequence number; pushback from requests started before the
+    last decrease is ignored, so one burst halves the limit only once.
+    """
+
+    def __init__(self, max_limit: int, grow_after: int = 10):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.grow_after = grow_after
+        self.in_flight = 0
+        self.successes = 0
+        self.started = 0
+        self.decreased_at = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            self.started += 1
+            return self.started
 
+    async def __aexit__(self, *exc_info):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
 
-def save_progress(progress_file: str, url: str):
-    """Append URL to progress file."""
-    with open(progress_file, 'a') as f:
-        f.write(url + '\n')
+    def record(self, ticket: int, status: int):
+        """Adjust the limit for the response to request `ticket`; call inside the `async with`."""
+        if status == 429 or status >= 500:
+            self.successes = 0
+            if ticket > self.decreased_at:
+                self.limit = max(1, self.limit // 2)
+                self.decreased_at = self.started
+        elif status == 200:
+            self.successes += 1
+            if self.successes >= self.grow_after and self.limit < self.max_limit:
+                self.limit += 1
+                self.successes = 0
 
 
-def submit_crawl(url: str, config: dict, dry_run: bool = False) -> bool:
-    """Submit a single URL to the crawler API."""
+async def submit_crawl(session: aiohttp.ClientSession, limiter: AsyncLimiter,
+                       gate: AdaptiveLimit, endpoint: str, base_payload: dict,
+                       url: str, use_browser: bool, dry_run: bool = False) -> bool:
+    """Submit a single URL to the crawler API.
+
+    base_payload holds the per-run constant fields; only url and
+    use_browser are added per call.
+    """
     if dry_run:
         print(f"  [DRY-RUN] Would crawl: {url}")
         return True
     
-    payload = {
-        "url": url,
-        "max_pages": config["max_pages_per_url"],
-        "same_domain": config["same_domain"],
-        "use_browser": needs_browser(url, config),
-    }
+    payload = {**base_payload, "url": url, "use_browser": use_browser}
     
     try:
-        response = requests.post(
-            f"{config['crawler_url']}/crawl",
-            json=payload,
-            timeout=10,
-        )
-        
-        if response.status_code == 200:
-            return True
-        else:
-            print(f"  ⚠️ Error submitting {url}: HTTP {response.status_code}")
-            return False
+        async with gate as ticket, limiter, session.post(
+            endpoint,
+            data=dumps_json(payload),
+            headers=JSON_HEADERS,
+            timeout=SUBMIT_TIMEOUT,
+        ) as response:
+            gate.record(ticket, response.status)
+            if response.status == 200:
+                return True
+            else:
+                print(f"  ⚠️ Error submitting {url}: HTTP {response.status}")
+                return False
     
-    except requests.exceptions.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         print(f"  ❌ Request failed for {url}: {e}")
         return False
 
 
-def group_by_domain(urls: list[str]) -> dict[str, list[str]]:
-    """Group URLs by their domain."""
-    groups = defaultdict(list)
-    for url in urls:
-        domain = parse_domain(url)
-        groups[domain].append(url)
-    return dict(groups)
+async def check_health(session: aiohttp.ClientSession, config: dict):
+    """Exit unless the crawler answers its health endpoint.
 
+    A bare TCP connect runs first, so a crawler that isn't listening fails
+    within a second instead of waiting out the HTTP timeout.
+    """
+    parsed = urlparse(config["crawler_url"])
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(parsed.hostname, port), timeout=1
+        )
+        writer.close()
+        await writer.wait_closed()
+        
+        async with session.get(
+            f"{config['crawler_url']}/health",
+            timeout=aiohttp.ClientTimeout(total=5),
+        ) as response:
+            if response.status != 200:
+                print(f"❌ Crawler not healthy: {response.status}")
+                sys.exit(1)
+        print(f"✅ Crawler is running at {config['crawler_url']}")
+    except (OSError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"❌ Cannot connect to crawler at {config['crawler_url']}: {str(e) or 'timed out'}")
+        print("   Make sure the spider is running: cargo run --bin spider")
+        sys.exit(1)
 
-def interleave_domains(domain_groups: dict[str, list[str]]) -> list[str]:
-    """Interleave URLs from different domains to spread load."""
-    return [
-        url
-        for row in zip_longest(*domain_groups.values())
-        for url in row
-        if url is not None
-    ]
 
+async def submit_all(session: aiohttp.ClientSession, records: Iterable[tuple[str, str, bool]],
+                     total: int, config: dict, progress_fh: TextIO | None,
+                     dry_run: bool = False) -> tuple[int, int]:
+    """Submit URLs through a pool of worker coroutines sharing one session.
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Bulk submit URLs to crawler API safely"
-    )
-    parser.add_argument("input_file", help="File containing URLs (one per line)")
-    parser.add_argument("--config", help="JSON config file")
-    parser.add_argument("--dry-run", action="store_true", 
-                        help="Don't actually submit, just show what would be done")
-    parser.add_argument("--limit", type=int, 
-                        help="Limit number of URLs to process")
-    parser.add_argument("--no-resume", action="store_true",
-                        help="Start fresh, ignore previous progress")
+    records are (url, domain, use_browser) tuples, consumed lazily through
+    a bounded queue, so they may come from a generator.
+
+    Successfully submitted URLs are appended to progress_fh, if given, in
+    batches of progress_flush_every. Returns (submitted, failed).
+    """
+    submitted = 0
+    failed = 0
+    pending: list[str] = []
+    flush_every = config["progress_flush_every"]
     
-    args = parser.parse_args()
+    def flush_progress():
+        if progress_fh is not None and pending:
+            progress_fh.write('\n'.join(pending) + '\n')
+            progress_fh.flush()
+            pending.clear()
     
-    # Load config
-    config = load_config(args.config)
+    async def producer():
+        for item in enumerate(records, 1):
+            await queue.put(item)
+        for _ in range(workers):
+            await queue.put(None)
     
-    # Check crawler health (unless dry run)
-    if not args.dry_run:
-        try:
-            response = requests.get(f"{config['crawler_url']}/health", timeout=5)
-            if response.status_code != 200:
-                print(f"❌ Crawler not healthy: {response.status_code}")
-                sys.exit(1)
-            print(f"✅ Crawler is running at {config['crawler_url']}")
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Cannot connect to crawler at {config['crawler_url']}: {e}")
-            print("   Make sure the spider is running: cargo run --bin spider")
-            sys.exit(1)
+    async def worker(session: aiohttp.ClientSession):
+        nonlocal submitted, failed
+        while (item := await queue.get()) is not None:
+            i, (url, domain, use_browser) = item
+            browser_mode = "🌐" if use_browser else "📄"
+            print(f"[{i}/{total}] {browser_mode} {domain}: {url[:60]}...")
+            
+            success = await submit_crawl(session, limiter, gate, endpoint, base_payload,
+                                         url, use_browser, dry_run=dry_run)
+            
+            if success:
+                submitted += 1
+                if progress_fh is not None:
+                    pending.append(url)
+                    if len(pending) >= flush_every:
+                        flush_progress()
+            else:
+                failed += 1
     
-    # Load URLs
-    print(f"📂 Loading URLs from {args.input_file}...")
-    all_urls = load_urls(args.input_file)
-    print(f"   Found {len(all_urls)} URLs")
+    workers = config["max_workers"]
+    if workers < 1:
+        raise ValueError(f"max_workers must be at least 1, got {workers}")
+    queue: asyncio.Queue[tuple[int, tuple[str, str, bool]] | None] = asyncio.Queue(maxsize=workers * 2)
+    limiter = AsyncLimiter(config["batch_size"], config["delay_between_batches_ms"] / 1000)
+    gate = AdaptiveLimit(workers)
+    endpoint = f"{config['crawler_url']}/crawl"
+    base_payload = {
+        "max_pages": config["max_pages_per_url"],
+        "same_domain": config["same_domain"],
+    }
+    try:
+        await asyncio.gather(producer(), *(worker(session) for _ in range(workers)))
+    finally:
+        # Also runs when Ctrl-C cancels the run, so finished URLs are kept.
+        flush_progress()
     
+    return submitted, failed
+
+
+def interleave_domains(domain_groups: dict[str, deque[str]]) -> Iterator[tuple[str, str]]:
+    """Yield (url, domain) round-robin across domains, popping URLs as they are consumed."""
+    queues = deque(domain_groups.items())
+    while queues:
+        domain, group = queues.popleft()
+        yield group.popleft(), domain
+        if group:
+            queues.append((domain, group))
+
+
+async def run(args: argparse.Namespace, config: dict):
+    """Open the shared session, check the crawler, then crawl the input file.
+
+    The health check runs before the input is read, so an unreachable
+    crawler fails fast, and its keep-alive connection is reused by the
+    submissions.
+    """
+    # The crawler is a single host, so cap the pool as a whole rather than per host.
+    connector = aiohttp.TCPConnector(limit=config["max_workers"], limit_per_host=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        if not args.dry_run:
+            await check_health(session, config)
+        await crawl_file(session, args, config)
+
+
+async def crawl_file(session: aiohttp.ClientSession, args: argparse.Namespace, config: dict):
+    """Stream, filter and interleave the input file, then submit it."""
     # Load progress
     progress_file = args.input_file + ".progress"
     if args.no_resume:
@@ -194,75 +371,73 @@ def main():
         if processed:
             print(f"   Resuming: {len(processed)} already processed")
     
-    # Filter URLs
-    print("🔍 Filtering URLs...")
-    filtered_urls = []
+    # Stream, filter and group URLs by domain in a single pass
+    print(f"📂 Loading and filtering URLs from {args.input_file}...")
+    found = 0
+    remaining = 0
     skipped_count = 0
     skip_reasons = defaultdict(int)
+    domain_groups = defaultdict(deque)
+    kept = set()
     
-    for url in all_urls:
+    for url in load_urls(args.input_file):
+        found += 1
+        # Already-processed URLs never reach the skip rules
         if url in processed:
             continue
         
-        should_skip, reason = should_skip_url(url, config)
+        should_skip, reason, domain = should_skip_url(url, config)
         if should_skip:
             skipped_count += 1
             skip_reasons[reason] += 1
-        else:
-            filtered_urls.append(url)
+            continue
+        
+        # Only kept URLs are deduplicated; skipped ones are rejected again anyway
+        if url in kept:
+            continue
+        kept.add(url)
+        domain_groups[domain].append(url)
+        remaining += 1
+        if remaining == args.limit:
+            break
     
+    print(f"   Found {found} URLs")
     print(f"   Skipped {skipped_count} URLs:")
     for reason, count in sorted(skip_reasons.items(), key=lambda x: -x[1])[:5]:
         print(f"     - {reason}: {count}")
-    print(f"   Remaining: {len(filtered_urls)} URLs to crawl")
-    
-    # Apply limit
-    if args.limit:
-        filtered_urls = filtered_urls[:args.limit]
-        print(f"   Limited to: {len(filtered_urls)} URLs")
+    if args.limit and remaining == args.limit:
+        print(f"   Limited to: {remaining} URLs")
+    print(f"   Remaining: {remaining} URLs to crawl")
     
-    if not filtered_urls:
+    if not remaining:
         print("✅ Nothing to do!")
         return
     
-    # Group and interleave by domain for better spreading
-    print("📊 Organizing by domain...")
-    domain_groups = group_by_domain(filtered_urls)
-    print(f"   {len(domain_groups)} unique domains")
-    
-    ordered_urls = interleave_domains(domain_groups)
+    # Interleave by domain for better spreading
+    print(f"📊 {len(domain_groups)} unique domains")
+    # Resolve browser mode once per domain rather than once per URL
+    browser_flags = {domain: needs_browser(domain, config) for domain in domain_groups}
+    records = (
+        (url, domain, browser_flags[domain])
+        for url, domain in interleave_domains(domain_groups)
+    )
     
     # Submit URLs
     print()
     print("🚀 Starting crawl submissions...")
-    print(f"   Delay between submissions: {config['delay_between_submissions_ms']}ms")
-    print(f"   Batch size: {config['batch_size']}")
+    print(f"   Rate limit: {config['batch_size']} per {config['delay_between_batches_ms']}ms")
+    print(f"   Concurrent workers: {config['max_workers']}")
     print()
     
-    submitted = 0
-    failed = 0
     start_time = time.time()
-    
-    for i, url in enumerate(ordered_urls, 1):
-        domain = parse_domain(url)
-        browser_mode = "🌐" if needs_browser(url, config) else "📄"
-        print(f"[{i}/{len(ordered_urls)}] {browser_mode} {domain}: {url[:60]}...")
-        
-        success = submit_crawl(url, config, dry_run=args.dry_run)
-        
-        if success:
-            submitted += 1
-            if not args.dry_run:
-                save_progress(progress_file, url)
-        else:
-            failed += 1
-        
-        if i < len(ordered_urls):
-            if i % config["batch_size"] == 0:
-                print(f"   ⏸️ Batch pause ({config['delay_between_batches_ms']}ms)...")
-                time.sleep(config["delay_between_batches_ms"] / 1000)
-            else:
-                time.sleep(config["delay_between_submissions_ms"] / 1000)
+    progress_fh = None if args.dry_run else open(progress_file, 'a')
+    try:
+        submitted, failed = await submit_all(
+            session, records, remaining, config, progress_fh, dry_run=args.dry_run
+        )
+    finally:
+        if progress_fh is not None:
+            progress_fh.close()
     
     # Summary
     elapsed = time.time() - start_time
@@ -270,7 +445,7 @@ def main():
     print("=" * 50)
     print("📈 Summary")
     print("=" * 50)
-    print(f"   Total URLs processed: {len(ordered_urls)}")
+    print(f"   Total URLs processed: {remaining}")
     print(f"   Submitted: {submitted}")
     print(f"   Failed: {failed}")
     print(f"   Time: {elapsed:.1f}s")
@@ -281,5 +456,40 @@ def main():
     print("   Monitor progress with: tail -f (spider logs)")
 
 
+def positive_int(value: str) -> int:
+    """argparse type for integers >= 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bulk submit URLs to crawler API safely"
+    )
+    parser.add_argument("input_file", help="File containing URLs (one per line)")
+    parser.add_argument("--config", help="JSON config file")
+    parser.add_argument("--dry-run", action="store_true", 
+                        help="Don't actually submit, just show what would be done")
+    parser.add_argument("--limit", type=int, 
+                        help="Limit number of URLs to process")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Start fresh, ignore previous progress")
+    parser.add_argument("--jobs", type=positive_int,
+                        help="Maximum concurrent submissions (default: max_workers from config)")
+    
+    args = parser.parse_args()
+    
+    # Load config
+    config = load_config(args.config)
+    if args.jobs is not None:
+        config["max_workers"] = args.jobs
+    if config["max_workers"] < 1:
+        parser.error(f"max_workers must be at least 1, got {config['max_workers']}")
+    
+    asyncio.run(run(args, config))
+
+
 if __name__ == "__main__":
     main()